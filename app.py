@@ -1,143 +1,595 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
-from math import isclose
-from itertools import combinations
+from math import comb, isqrt
+from multiprocessing import Pool
+import html
 import io
+import os
 from datetime import datetime
 import time
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; sums fall back to the dict DP
+    njit = None
+
+try:
+    import python_calamine  # noqa: F401  Rust-backed .xlsx reader for pandas
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+try:
+    import pyarrow  # noqa: F401  Multithreaded CSV parser for pandas
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# CSV rows read to infer which columns are numeric before the full parse
+CSV_SAMPLE_ROWS = 1000
+
+# Parsed uploads stay in the (process-wide) cache for at most this long
+UPLOAD_CACHE_TTL = 60 * 60  # Seconds
+UPLOAD_CACHE_MAX_ENTRIES = 4
+
+# Decimal places scaled away for integer searches; bitset snapshot memory
+MAX_DECIMALS = 4
+MAX_BITSET_BYTES = 256 * 1024 * 1024
+
+# Ratios checked per vectorized block (bounds the temporary arrays)
+PAIR_BLOCK_SIZE = 1 << 22
+
+# Smallest total search (in progress steps) worth starting worker processes for
+PARALLEL_MIN_STEPS = 10 ** 7
+
+# Pair count above which product triplets are sampled and quotients use a sorted search
+MAX_SEARCH_PAIRS = 10 ** 8
+
+# Distinct partial sums the non-bitset sum DP may hold (up to 2^n otherwise)
+MAX_SUM_STATES = 2 * 10 ** 6
+
+# Result tables shorter than this are rendered as plain HTML
+HTML_TABLE_MAX_ROWS = 50
+
 # --- Progress Tracking ---
 class ProgressTracker:
+    min_interval = 0.1  # Seconds between redraws; each one is a websocket round-trip
+
     def __init__(self, total_steps):
         self.progress_bar = st.progress(0)
         self.status_text = st.empty()
         self.current_step = 0
-        self.total_steps = total_steps
+        self.total_steps = max(total_steps, 1)
+        self._last = 0.0
+
+    def update(self, message, steps=1):
+        self.current_step += steps
+        now = time.monotonic()
+        if now - self._last < self.min_interval and self.current_step < self.total_steps:
+            return
+        self._last = now
 
-    def update(self, message):
-        self.current_step += 1
         progress = min(self.current_step / self.total_steps, 1.0)
         self.progress_bar.progress(progress)
         self.status_text.text(f"{message} ({self.current_step}/{self.total_steps})")
 
+    def finish(self, message):
+        # Solvers skip zeros, repeats and early exits, so the count can fall short
+        self._last = 0.0
+        self.update(message, steps=self.total_steps - self.current_step)
+
 # --- Core Functions with Progress ---
-def find_subsets(data, targets, operation, tolerance=0, progress=None):
-    results = []
-    for i, target in enumerate(targets):
+def find_subsets(values, columns, rows, targets, operation, tolerance=0, progress=None):
+    """
+    Runs the solver for each target. `values`, `columns` and `rows` are
+    parallel arrays; solvers only see `values` and return indices into them
+    """
+    # Worker start-up costs ~1 s under spawn, so small searches stay in-process
+    total_steps = len(targets) * search_steps(operation, len(values))
+    if len(targets) > 1 and total_steps >= PARALLEL_MIN_STEPS:
+        found = _search_parallel(values, targets, operation, tolerance, progress)
+    else:
+        found = []
+        for target in targets:
+            if progress:
+                progress.update(f"Searching for {target}", steps=0)
+            found.append(_search_one(values, target, operation, tolerance, progress))
+    if progress:
+        progress.finish("Search complete")
+
+    return [(target, reconstruct_items(values, columns, rows, indices))
+            for target, indices in zip(targets, found) if indices is not None]
+
+def _search_parallel(values, targets, operation, tolerance, progress=None):
+    """
+    Searches targets in worker processes (the solvers are CPU-bound and hold
+    the GIL). Progress is reported from this process as targets complete
+    """
+    found = [None] * len(targets)
+    steps = search_steps(operation, len(values))
+    jobs = [(pos, (values, target, operation, tolerance)) for pos, target in enumerate(targets)]
+    with Pool(min(len(targets), os.cpu_count() or 1)) as pool:
+        for pos, indices in pool.imap_unordered(_search_job, jobs):
+            found[pos] = indices
+            if progress:
+                progress.update(f"Searched for {targets[pos]}", steps=steps)
+    return found
+
+def _search_job(job):
+    """
+    Helper: Pool worker entry point, keeps the target's position with its result
+    """
+    pos, args = job
+    return pos, _search_one(*args)
+
+def search_steps(operation, n):
+    """
+    Progress steps for one target: items for sum, candidate pairs (and
+    triplets for product) otherwise. Solvers advance the tracker in these units
+    """
+    if operation == "sum":
+        return n
+    elif operation == "product":
+        return comb(n, 2) + comb(n, 3)
+    return comb(n, 2)
+
+def product_triplets_sampled(values):
+    """
+    True when the product triplet phase will search a random sample: its cost
+    grows with pairs of candidate values, capped at MAX_SEARCH_PAIRS
+    """
+    return comb(len(_product_candidates(values)), 2) > MAX_SEARCH_PAIRS
+
+def _search_one(values, target, operation, tolerance, progress=None):
+    if operation == "sum":
+        return find_subset_sum(values, target, tolerance, progress)
+    elif operation == "product":
+        return find_subset_product(values, target, tolerance, progress)
+    elif operation == "difference":
+        return find_subset_difference(values, target, tolerance, progress)
+    elif operation == "quotient":
+        return find_subset_quotient(values, target, tolerance, progress)
+
+def find_subset_sum(values, target, tolerance, progress=None):
+    scale = _integer_scale(values, target, tolerance)
+    if scale is None:
+        if njit is None:
+            return _subset_sum_dict(values, target, tolerance, progress)
+        indices, complete = _subset_sum_numba(values, float(target), float(tolerance), MAX_SUM_STATES)
+        if not complete:
+            _raise_sum_too_large(len(values))
         if progress:
-            progress.update(f"Searching for {target}")
-
-        if operation == "sum":
-            subset = find_subset_sum(data, target, tolerance, progress)
-        elif operation == "product":
-            subset = find_subset_product(data, target, tolerance, progress)
-        elif operation == "difference":
-            subset = find_subset_difference(data, target, tolerance, progress)
-        elif operation == "quotient":
-            subset = find_subset_quotient(data, target, tolerance, progress)
-
-        if subset:
-            results.append((target, subset))
-    return results
-
-def find_subset_sum(data, target, tolerance, progress=None):
+            progress.update("Checking sum combinations", steps=len(values))
+        return indices if indices.size else None
+
+    return _subset_sum_bitset(values, scale, target, tolerance, progress)
+
+
+def _subset_sum_dict(values, target, tolerance, progress=None):
+    """
+    Pure-Python fallback when neither the bitset nor Numba is available
+    """
+    low, high = target - tolerance, target + tolerance
     dp = {0: []}
-    for i, item in enumerate(data):
+    for i, value in enumerate(values.tolist()):
         if progress and i % 100 == 0:  # Update every 100 items
-            progress.update(f"Checking sum combinations")
+            progress.update("Checking sum combinations", steps=min(100, len(values) - i))
 
         for s in list(dp.keys()):
-            new_sum = s + item["value"]
-            if abs(new_sum - target) <= tolerance:
-                return dp[s] + [item]
+            new_sum = s + value
+            if low <= new_sum <= high:
+                return np.array(dp[s] + [i])
             if new_sum not in dp:
-                dp[new_sum] = dp[s] + [item]
+                if len(dp) >= MAX_SUM_STATES:
+                    _raise_sum_too_large(len(values))
+                dp[new_sum] = dp[s] + [i]
     return None
 
 
-def find_subset_difference(data, target, tolerance, progress=None):
+def _raise_sum_too_large(n):
+    raise ValueError(f"Sum search over {n:,} values gave up after {MAX_SUM_STATES:,} "
+                     "partial sums; select fewer columns or a smaller target")
+
+
+def _subset_sum_numba(values, target, tolerance, max_states):
     """
-    Finds two numbers where |a - b| ≈ target (±tolerance)
-    Returns list of items with column/row info
+    Same DP as _subset_sum_dict on flat arrays, compiled with Numba:
+    each reachable sum is a node storing its parent node and added item.
+    Returns (item indices, complete); indices are empty when no subset
+    matches, complete is False if the search stopped at max_states sums
+    """
+    sums = [0.0]
+    parents = [-1]
+    items = [-1]
+    seen = {0.0: 0}
+    for i in range(values.size):
+        for node in range(len(sums)):
+            new_sum = sums[node] + values[i]
+            if abs(new_sum - target) <= tolerance:
+                indices = [i]
+                while node > 0:
+                    indices.append(items[node])
+                    node = parents[node]
+                indices.reverse()
+                return np.array(indices, dtype=np.int64), True
+            if new_sum not in seen:
+                if len(sums) >= max_states:
+                    return np.empty(0, dtype=np.int64), False
+                seen[new_sum] = len(sums)
+                sums.append(new_sum)
+                parents.append(node)
+                items.append(i)
+    return np.empty(0, dtype=np.int64), True
+
+
+if njit is not None:
+    _subset_sum_numba = njit(cache=True)(_subset_sum_numba)
+
+
+def _subset_sum_bitset(values, scale, target, tolerance, progress=None):
+    """
+    Bit-parallel subset sum: bit k of `reachable` is set when some subset
+    sums to k / scale. Each item ORs in a copy shifted by its value.
+    Returns indices into values, or None when no subset matches
     """
-    values = [item["value"] for item in data]  # Extract numerical values
+    lo, hi = _scaled_bounds(target, tolerance, scale)
+    lo = max(lo, 0)
+    if hi < lo:
+        return None
+
+    reachable = np.zeros(hi // 64 + 1, dtype=np.uint64)
+    reachable[0] = 1
+    # Items past hi can't be in a match; clipping keeps huge values from overflowing int64
+    ints = np.minimum(np.rint(values * scale), hi + 1).astype(np.int64).tolist()
+    snapshots = []  # reachable before each item, for backtracking
+
+    for i, a in enumerate(ints):
+        if progress and i % 100 == 0:  # Update every 100 items
+            progress.update("Checking sum combinations", steps=min(100, len(values) - i))
+
+        snapshots.append(reachable)
+        shifted = _shift_bits(reachable, a)
+        found = _first_bit_in_range(shifted, lo, hi)
+        if found >= 0:
+            # Walk back: keep item j only if the rest isn't reachable without it
+            indices = [i]
+            remaining = found - a
+            for j in range(i - 1, -1, -1):
+                if remaining == 0:
+                    break
+                if not _has_bit(snapshots[j], remaining):
+                    indices.append(j)
+                    remaining -= ints[j]
+            return np.array(indices[::-1])
+        reachable = reachable | shifted
+    return None
 
-    # Check all unique pairs
-    for (a, b) in combinations(values, 2):
-        if progress:
-            progress.update("Checking difference combinations")
 
-        if abs(abs(a - b) - target) <= tolerance:
-            # Find and return the original items with metadata
-            return reconstruct_items(data, [a, b])
+def _integer_scale(values, target, tolerance):
+    """
+    Helper: Decimal scale for the bitset search, or None when it doesn't apply
+    """
+    if values.size == 0 or (values < 0).any() or target + tolerance < 0:
+        return None
+
+    scale = _decimal_scale(values)
+    if scale is None:
+        return None
+    words = int((target + tolerance) * scale) // 64 + 1
+    if words * len(values) * 8 > MAX_BITSET_BYTES:
+        return None
+    return scale
+
 
+def _decimal_scale(values):
+    """
+    Helper: Smallest power of ten that turns every value into an integer,
+    or None if the values have more than MAX_DECIMALS decimal places
+    """
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        # Exact round trip: 0.1 * 10 rounds back to 0.1, 1e-7 * 10**4 doesn't
+        if np.array_equal(np.rint(values * scale) / scale, values):
+            return scale
     return None
 
 
-def find_subset_product(data, target, tolerance, progress=None):
+def _scaled_bounds(target, tolerance, scale):
     """
-    Finds subset where product ≈ target (±tolerance%)
-    Checks pairs and triplets
+    Helper: Integer range [lo, hi] of k with k / scale within target ± tolerance.
+    The few-ulp slack only absorbs rounding in the multiplication
     """
-    values = [item["value"] for item in data if item["value"] != 0]  # Exclude zeros
+    low = (target - tolerance) * scale
+    high = (target + tolerance) * scale
+    lo = int(np.ceil(low - 4 * np.spacing(abs(low))))
+    hi = int(np.floor(high + 4 * np.spacing(abs(high))))
+    return lo, hi
+
+
+def _shift_bits(bits, shift):
+    """
+    Helper: Shifts a little-endian uint64 bitset towards higher bits,
+    dropping anything past the end
+    """
+    out = np.zeros_like(bits)
+    words, offset = divmod(shift, 64)
+    if words >= bits.size:
+        return out
+
+    src = bits[:bits.size - words]
+    if offset:
+        out[words:] = src << np.uint64(offset)
+        out[words + 1:] |= src[:-1] >> np.uint64(64 - offset)
+    else:
+        out[words:] = src
+    return out
+
+
+def _has_bit(bits, k):
+    return bool((bits[k >> 6] >> np.uint64(k & 63)) & np.uint64(1))
 
-    # Check pairs first (most common case)
-    for subset in combinations(values, 2):
-        if progress:
-            progress.update("Checking product pairs")
 
-        product = subset[0] * subset[1]
-        if abs(product - target) <= tolerance * target:
-            return reconstruct_items(data, subset)
+def _first_bit_in_range(bits, lo, hi):
+    """
+    Helper: Lowest set bit in [lo, hi], or -1
+    """
+    first = lo // 64
+    words = bits[first:hi // 64 + 1].astype("<u8")
+    flags = np.unpackbits(words.view(np.uint8), bitorder="little")
+    hits = np.flatnonzero(flags[lo - first * 64:hi - first * 64 + 1])
+    return lo + int(hits[0]) if hits.size else -1
+
+
+def find_subset_difference(values, target, tolerance, progress=None):
+    """
+    Finds two numbers where |a - b| ≈ target (±tolerance)
+    Returns indices of the pair, larger value first
+    """
+    if not values.size or target + tolerance < 0:
+        return None
+
+    order = np.argsort(values, kind="stable")
+    s = values[order]
 
-    # Check triplets if no pair found
-    for subset in combinations(values, 3):
+    eps = 1e-12 * (np.abs(s) + abs(target))  # Absorb float rounding at the band edges
+    lo_offset = np.maximum(target - tolerance - eps, 0)
+    hi_offset = target + tolerance + eps
+
+    # For each a, binary-search the sorted values for b in a + [target ± tolerance]
+    lo = np.searchsorted(s, s + lo_offset)
+    hi = np.searchsorted(s, s + hi_offset, side="right")
+    positions = np.arange(len(s))
+    partner = np.where(lo == positions, lo + 1, lo)  # a can't pair with itself
+    hits = np.flatnonzero(partner < hi)
+    if progress:
+        progress.update("Checking difference combinations", steps=comb(len(s), 2))
+    if not hits.size:
+        return None
+
+    i = hits[0]
+    # Larger value first so the formula reads a − b
+    return order[[partner[i], i]]
+
+
+def find_subset_product(values, target, tolerance, progress=None):
+    """
+    Finds subset where product ≈ target (±tolerance%)
+    Checks pairs and triplets
+    """
+    nonzero = _product_candidates(values)
+    if nonzero.size < 2:
+        return None
+    band = abs(tolerance * target)
+    band_lo, band_hi = target - band, target + band
+
+    order = nonzero[np.argsort(values[nonzero], kind="stable")]
+    s = values[order]
+    positions = np.arange(len(s))
+
+    # Check pairs first (most common case): one binary search per value
+    hit = _search_factor(s, s, positions + 1, band_lo, band_hi)
+    if progress:
+        progress.update("Checking product pairs", steps=comb(len(s), 2))
+    if hit:
+        i, k = hit
+        return order[[i, k]]
+
+    # Triplet cost grows with pairs of values; past MAX_SEARCH_PAIRS they run on
+    # a random sample (the pair search above always sees every value)
+    if comb(len(s), 2) > MAX_SEARCH_PAIRS:
+        picked = np.random.default_rng().choice(len(s), isqrt(2 * MAX_SEARCH_PAIRS), replace=False)
+        picked.sort()  # Keeps s sorted
+        s, order = s[picked], order[picked]
+        positions = np.arange(len(s))
+    if len(s) < 3:
+        return None
+
+    # Check triplets if no pair found: fix a, search c for every a·b with b after a.
+    # Skip any a whose magnitude can't bring |a·b·c| into the band
+    mags = np.abs(s)
+    by_size = np.sort(mags)
+    min_pair = by_size[0] * by_size[1]  # Smallest possible |b·c|
+    max_pair = by_size[-1] * by_size[-2]  # Largest possible |b·c|
+    low = (abs(target) - band) * (1 - 1e-9)
+    high = (abs(target) + band) * (1 + 1e-9)
+    for i in range(len(s) - 2):
         if progress:
-            progress.update("Checking product triplets")
+            progress.update("Checking product triplets", steps=comb(len(s) - 1 - i, 2))
+        if mags[i] * max_pair < low or mags[i] * min_pair > high:
+            continue
 
-        product = subset[0] * subset[1] * subset[2]
-        if abs(product - target) <= tolerance * target:
-            return reconstruct_items(data, subset)
+        heads = s[i] * s[i + 1:-1]
+        hit = _search_factor(s, heads, positions[i + 2:], band_lo, band_hi)
+        if hit:
+            j, k = hit
+            return order[[i, i + 1 + j, k]]
 
     return None
 
 
-def find_subset_quotient(data, target, tolerance, progress=None):
+def _product_candidates(values):
     """
-    Finds pair where a/b ≈ target (±tolerance%)
-    or b/a ≈ target
+    Helper: Indices the product search uses: no zeros, and no more than
+    the three copies of a value a triplet can use
     """
-    data = [item for item in data if item["value"] != 0]  # Exclude division by zero
-    values = [item["value"] for item in data]
+    nonzero = np.flatnonzero(values)
+    return nonzero[_limit_copies(values[nonzero], 3)]
 
-    for (a, b) in combinations(values, 2):
+
+def _search_factor(s, heads, first, band_lo, band_hi):
+    """
+    Helper: For each head h, binary-searches sorted s[first:] for c with
+    band_lo <= h·c <= band_hi. Returns (head index, position in s) or None
+    """
+    bound_a = band_lo / heads
+    bound_b = band_hi / heads
+    lo = np.minimum(bound_a, bound_b)
+    hi = np.maximum(bound_a, bound_b)
+    lo -= 1e-9 * np.abs(lo)  # Absorb float rounding at the band edges
+    hi += 1e-9 * np.abs(hi)
+
+    start = np.maximum(np.searchsorted(s, lo), first)
+    stop = np.searchsorted(s, hi, side="right")
+    hits = np.flatnonzero(start < stop)
+    if not hits.size:
+        return None
+    return hits[0], start[hits[0]]
+
+
+def find_subset_quotient(values, target, tolerance, progress=None):
+    """
+    Finds pair where a/b ≈ target (±tolerance%)
+    or b/a ≈ target. Returns indices ordered dividend first
+    """
+    nonzero = np.flatnonzero(values)  # Exclude division by zero
+    nonzero = nonzero[_limit_copies(values[nonzero], 2)]  # A pair uses ≤2 copies
+    vals = values[nonzero]
+    n = len(vals)
+
+    if comb(n, 2) > MAX_SEARCH_PAIRS:
+        # Too many pairs for the ratio matrix: binary-search each divisor instead
+        pair = _search_quotient(vals, target, tolerance)
+        if progress:
+            progress.update("Checking quotient pairs", steps=comb(n, 2))
+        return None if pair is None else nonzero[pair]
+
+    # Row i of the ratio matrix holds vals[i] / vals[j] for every j, so b/a
+    # is just another entry; rows are processed in blocks to bound memory
+    rows_per_block = max(1, PAIR_BLOCK_SIZE // max(n, 1))
+    for start in range(0, n, rows_per_block):
+        stop = min(start + rows_per_block, n)
+        ratios = vals[start:stop, None] / vals[None, :]
+        mask = _isclose(ratios, target, tolerance)
+        mask[np.arange(stop - start), np.arange(start, stop)] = False  # a/a
         if progress:
-            progress.update("Checking quotient pairs")
+            progress.update("Checking quotient pairs", steps=comb(n - start, 2) - comb(n - stop, 2))
 
-        if (isclose(a / b, target, rel_tol=tolerance) or
-                isclose(b / a, target, rel_tol=tolerance)):
-            return reconstruct_items(data, [a, b])
+        first = mask.argmax()  # First True, or 0 when there is none
+        if mask.flat[first]:
+            i, j = divmod(first, n)
+            return nonzero[[start + i, j]]
 
     return None
 
 
-def reconstruct_items(full_data, values):
+def _search_quotient(vals, target, tolerance):
+    """
+    Helper: O(n log n) quotient search. isclose(a / b, target) holds for
+    ratios between target·(1 - tol) and target / (1 - tol), so each divisor b
+    binary-searches the sorted values for a in b times that range.
+    Returns positions (dividend, divisor) in vals, or None
+    """
+    if target == 0:
+        return None  # a / b is never 0 for non-zero a
+
+    order = np.argsort(vals, kind="stable")
+    s = vals[order]
+    bound_a = s * (target * (1 - tolerance))
+    bound_b = s * (target / (1 - tolerance))  # Tolerance is capped well below 100%
+    lo = np.minimum(bound_a, bound_b)
+    hi = np.maximum(bound_a, bound_b)
+    lo -= 1e-12 * np.abs(lo)  # Absorb float rounding at the band edges
+    hi += 1e-12 * np.abs(hi)
+
+    positions = np.arange(len(s))
+    start = np.searchsorted(s, lo)
+    stop = np.searchsorted(s, hi, side="right")
+    dividend = np.where(start == positions, start + 1, start)  # b can't divide itself
+    hits = np.flatnonzero(dividend < stop)
+    if not hits.size:
+        return None
+
+    k = hits[0]
+    return order[[dividend[k], k]]
+
+
+def _limit_copies(values, keep):
     """
-    Helper: Maps values back to original items with metadata
+    Helper: Indices of values with at most `keep` copies of each distinct
+    value, in original order. Further repeats can't form a new combination
     """
-    result = []
-    remaining = list(values)
+    if len(values) <= keep:
+        return np.arange(len(values))
+
+    order = np.argsort(values, kind="stable")
+    s = values[order]
+    positions = np.arange(len(s))
+    run_start = np.maximum.accumulate(np.where(np.r_[True, s[1:] != s[:-1]], positions, 0))
+    return np.sort(order[positions - run_start < keep])
 
-    for item in full_data:
-        if item["value"] in remaining:
-            result.append(item)
-            remaining.remove(item["value"])
-            if not remaining:
-                return result
-    return None
+
+def _isclose(x, target, rel_tol):
+    """
+    Helper: Vectorized math.isclose(x, target, rel_tol=rel_tol)
+    """
+    return np.abs(x - target) <= rel_tol * np.maximum(np.abs(x), abs(target))
+
+
+def reconstruct_items(values, columns, rows, indices):
+    """
+    Helper: Maps indices back to (value, column, row) tuples. Values are
+    stored as float64, so whole numbers go back to int for display
+    """
+    shown = [int(v) if v.is_integer() else v for v in values[indices].tolist()]
+    return list(zip(shown, columns[indices], rows[indices].tolist()))
 
 # ... [keep other functions unchanged but add progress param] ...
 
+@st.cache_data(show_spinner=False, ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES)
+def _load_table(file_bytes, name, usecols=None):
+    """
+    Parses an uploaded sheet. Cached on the file contents, so re-running
+    a search on the same upload skips the parse. `usecols` limits CSV
+    parsing to the chosen columns; workbooks are always read whole
+    """
+    bio = io.BytesIO(file_bytes)
+    if name.endswith('.xlsx'):
+        return pd.read_excel(bio, engine=EXCEL_ENGINE)
+    return pd.read_csv(bio, engine=_csv_engine(file_bytes), usecols=usecols,
+                       dtype_backend="numpy_nullable")
+
+def _csv_engine(file_bytes):
+    """
+    Helper: The C engine (used for the column sample) renames a repeated
+    header "a" to "a.1"; pyarrow keeps both as "a" and can't find "a.1".
+    Such files stay on the C engine so both passes agree on names
+    """
+    header = pd.read_csv(io.BytesIO(file_bytes), header=None, nrows=1).iloc[0]
+    return "c" if header.duplicated().any() else CSV_ENGINE
+
+@st.cache_data(show_spinner=False, ttl=UPLOAD_CACHE_TTL, max_entries=UPLOAD_CACHE_MAX_ENTRIES)
+def _numeric_columns(file_bytes, name):
+    """
+    Column choices for the upload. CSV dtypes are inferred from the first
+    CSV_SAMPLE_ROWS rows so the full parse can wait for the selection
+    """
+    if name.endswith('.xlsx'):
+        df = _load_table(file_bytes, name)
+    else:
+        df = pd.read_csv(io.BytesIO(file_bytes), nrows=CSV_SAMPLE_ROWS)
+    return list(df.select_dtypes(include=['number']).columns)
+
 # --- UI Setup ---
 def main():
     st.set_page_config(page_title="Target Value Finder", layout="wide")
@@ -176,39 +628,59 @@ def main():
     # Main Content
     uploaded_file = st.file_uploader("📤 Upload Excel/CSV", type=["xlsx", "csv"])
 
-    if uploaded_file and st.button("🔍 Find Matches", type="primary"):
-        try:
-            # Data Loading
-            if uploaded_file.name.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file, engine='openpyxl')
-            else:
-                df = pd.read_csv(uploaded_file)
+    if not uploaded_file:
+        return
+
+    try:
+        # Data Loading: sample for column choices, full parse on search
+        file_bytes = uploaded_file.getvalue()
+        numeric_cols = _numeric_columns(file_bytes, uploaded_file.name)
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        st.stop()
 
-            numeric_cols = df.select_dtypes(include=['number']).columns
-            selected_cols = st.multiselect("Select columns:", numeric_cols, default=list(numeric_cols))
+    selected_cols = st.multiselect("Select columns:", numeric_cols, default=numeric_cols)
 
+    if st.button("🔍 Find Matches", type="primary"):
+        try:
             if not selected_cols:
                 st.warning("Please select columns")
                 st.stop()
 
-            # Prepare data
-            data = []
-            for col in selected_cols:
-                for idx, value in df[col].dropna().items():
-                    data.append({
-                        "value": value,
-                        "column": col,
-                        "row": idx + 2
-                    })
-
-            # Estimate progress steps
-            progress_steps = len(targets) * len(data)  # Rough estimate
+            # st.cache_data keys on the arguments as passed, so workbooks (read
+            # whole anyway) make the exact call _numeric_columns made
+            if uploaded_file.name.endswith('.xlsx'):
+                df = _load_table(file_bytes, uploaded_file.name)
+            else:
+                df = _load_table(file_bytes, uploaded_file.name, selected_cols)
+            # A column can look numeric in the sample and hold text further down
+            selected_cols = [col for col in selected_cols
+                             if pd.api.types.is_numeric_dtype(df[col])]
+            if not selected_cols:
+                st.warning("Selected columns contain non-numeric values")
+                st.stop()
+
+            # Prepare data as parallel value/column/row arrays. Columns are
+            # melted by position so sheet headers can't clash with melt's names
+            long = (df[selected_cols]
+                    .set_axis(range(len(selected_cols)), axis=1)
+                    .melt(ignore_index=False, var_name="column", value_name="value")
+                    .dropna(subset=["value"]))
+            values = long["value"].to_numpy(dtype=np.float64)
+            columns = np.asarray(selected_cols, dtype=object)[long["column"].to_numpy()]
+            rows = (long.index.to_numpy() + 2).astype(np.int32)
+            if operation == "product" and product_triplets_sampled(values):
+                st.warning("Too many distinct values for an exact triplet search; pairs are "
+                           "checked exhaustively, triplets on a random sample")
+
+            # Progress is counted in items/pairs/triplets checked
+            progress_steps = len(targets) * search_steps(operation, len(values))
             progress = ProgressTracker(progress_steps)
 
             # Run search
             with st.spinner("Starting search..."):
                 start_time = time.time()
-                results = find_subsets(data, targets, operation, tolerance, progress)
+                results = find_subsets(values, columns, rows, targets, operation, tolerance, progress)
                 duration = time.time() - start_time
 
             # Display results
@@ -229,24 +701,26 @@ def display_results(results, operation):
         with st.expander(f"Target: {target}", expanded=True):
             # Generate formula
             if operation == "sum":
-                formula = " + ".join(str(item["value"]) for item in subset)
+                formula = " + ".join(str(value) for value, _, _ in subset)
             elif operation == "product":
-                formula = " × ".join(str(item["value"]) for item in subset)
+                formula = " × ".join(str(value) for value, _, _ in subset)
             elif operation == "difference":
-                formula = f"{subset[0]['value']} − {subset[1]['value']}"
+                formula = f"{subset[0][0]} − {subset[1][0]}"
             elif operation == "quotient":
-                formula = f"{subset[0]['value']} ÷ {subset[1]['value']}"
+                formula = f"{subset[0][0]} ÷ {subset[1][0]}"
 
             st.markdown(f"**Solution:** {formula} = {target}")
 
-            # Detailed table
-            result_df = pd.DataFrame([{
-                "Value": item["value"],
-                "Column": item["column"],
-                "Row": item["row"]
-            } for item in subset])
-
-            st.dataframe(result_df)
+            # Detailed table: small ones skip the DataFrame/Arrow round-trip
+            if len(subset) < HTML_TABLE_MAX_ROWS:
+                rows_html = "".join(
+                    f"<tr><td>{value}</td><td>{html.escape(str(column))}</td><td>{row}</td></tr>"
+                    for value, column, row in subset)
+                st.markdown("<table><tr><th>Value</th><th>Column</th><th>Row</th></tr>"
+                            f"{rows_html}</table>", unsafe_allow_html=True)
+            else:
+                result_df = pd.DataFrame(subset, columns=["Value", "Column", "Row"])
+                st.dataframe(result_df)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file